@@ -1,5 +1,6 @@
 # main.py
 
+import os
 import time
 from fastapi import FastAPI, Depends, status, HTTPException
 from sqlalchemy.orm import Session
@@ -32,7 +33,8 @@ async def lifespan(app: FastAPI):
     global recommender_instance
     print("서버 시작 중: RecommenderFast 인스턴스 생성 및 데이터 로딩 시작...")
     db_session = SessionLocal()
-    recommender_instance = RecommenderFast(db_session)
+    sharded = os.getenv("RECOMMENDER_SHARDED", "false").lower() == "true"
+    recommender_instance = RecommenderFast(db_session, sharded=sharded)
     db_session.close()
     print("데이터 로딩 완료. 서버가 요청을 처리할 준비가 되었습니다.")
     yield
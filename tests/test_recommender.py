@@ -39,9 +39,16 @@ class MockQuery:
     def all(self):
         return self.items
 
+    def join(self, target):
+        return self
+
     def filter(self, condition):
-        recommended_ids = getattr(condition.right, 'value', [])
-        filtered = [p for p in self.items if p.place_id in recommended_ids]
+        value = getattr(condition.right, 'value', [])
+        if condition.left.table.name == "user_location":
+            filtered = [u for u in self.items if any(l.value == value for l in u.locations)]
+        else:
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            filtered = [i for i in self.items if getattr(i, condition.left.key) in values]
         return MockQuery(filtered)
 
 class MockDB:
@@ -112,3 +119,152 @@ def test_recommender_basic():
     assert recommended_place.is_free is True
     assert recommended_place.name == "Seoul Library"
     assert recommended_place.type == PlaceEnum.공공학습공간
+
+class MockShardedDB(MockDB):
+    def __init__(self):
+        super().__init__()
+        self.users = [
+            MockUser(1, prefer_places=[MockEnum("카페")], purposes=[MockEnum("휴식")], locations=[MockEnum("강북권")]),
+            MockUser(2, prefer_places=[MockEnum("카페")], purposes=[MockEnum("휴식")], locations=[MockEnum("강북권")]),
+            MockUser(3, prefer_places=[MockEnum("카페")], purposes=[MockEnum("휴식")], locations=[MockEnum("서남권")]),
+            MockUser(4, prefer_places=[MockEnum("도서관")], purposes=[MockEnum("집중공부")], locations=[MockEnum("서남권")]),
+            MockUser(5, prefer_places=[MockEnum("카페")], purposes=[MockEnum("휴식")]),
+        ]
+        self.likes = [MockLike(2, 101), MockLike(3, 102)]
+
+def test_recommender_sharded():
+    mock_db = MockShardedDB()
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=2)
+    reference = RecommenderFast(mock_db)
+
+    assert set(recommender.shards.keys()) == {"강북권", "서남권", None}
+    assert recommender.shards["강북권"]["user_id_list"].tolist() == [1, 2]
+    assert recommender.shards[None]["similarity_matrix"] is None
+
+    # 같은 지역 샤드 안에서만 검색
+    assert recommender.get_similar_users(1) == [2]
+    assert recommender.get_similar_users(3) == [4]
+
+    # 지역이 없는 사용자는 전체 샤드에서 검색
+    assert recommender.get_similar_users(5, n_users=3) == reference.get_similar_users(5, n_users=3)
+
+    recommendations = recommender.recommend_places(1)
+    assert [p.place_id for p in recommendations] == [101]
+
+def test_recommender_primary_region_is_deterministic():
+    mock_db = MockShardedDB()
+    mock_db.users.append(
+        MockUser(6, prefer_places=[MockEnum("카페")], locations=[MockEnum("서남권"), MockEnum("강북권")])
+    )
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=1)
+
+    assert recommender.user_regions[6] == min("서남권", "강북권")
+
+def test_recommender_sharded_fallback_ranking():
+    mock_db = MockShardedDB()
+    mock_db.users = [
+        MockUser(1, prefer_places=[MockEnum("카페")] * 3, locations=[MockEnum("강북권")]),
+        MockUser(2, prefer_places=[MockEnum("카페")] * 2, locations=[MockEnum("강북권")]),
+        MockUser(3, purposes=[MockEnum("휴식"), MockEnum("집중공부"), MockEnum("개인공부")], locations=[MockEnum("서남권")]),
+        MockUser(4, purposes=[MockEnum("휴식"), MockEnum("집중공부")], locations=[MockEnum("서남권")]),
+        MockUser(5, prefer_places=[MockEnum("카페")], purposes=[MockEnum("휴식"), MockEnum("집중공부"), MockEnum("개인공부")]),
+    ]
+    mock_db.likes = []
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=2)
+    reference = RecommenderFast(mock_db)
+
+    expected = reference.get_similar_users(5, n_users=4)
+    assert expected == [3, 4, 1, 2]
+    assert recommender.get_similar_users(5, n_users=4) == expected
+
+def test_recommender_sharded_fallback_tie_order():
+    mock_db = MockShardedDB()
+    mock_db.users = [
+        MockUser(1, prefer_places=[MockEnum("카페")], locations=[MockEnum("강북권")]),
+        MockUser(2, prefer_places=[MockEnum("카페")], locations=[MockEnum("서남권")]),
+        MockUser(3, prefer_places=[MockEnum("카페")], locations=[MockEnum("강북권")]),
+        MockUser(4, prefer_places=[MockEnum("카페")]),
+    ]
+    mock_db.likes = []
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=2)
+    reference = RecommenderFast(mock_db)
+
+    assert recommender.get_similar_users(4, n_users=3) == reference.get_similar_users(4, n_users=3)
+
+def test_recommender_sharded_lone_user_falls_back():
+    mock_db = MockShardedDB()
+    mock_db.users.append(
+        MockUser(6, prefer_places=[MockEnum("도서관")], purposes=[MockEnum("집중공부")], locations=[MockEnum("도심권")])
+    )
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=2)
+
+    assert recommender.shards["도심권"]["user_id_list"].tolist() == [6]
+    assert recommender.get_similar_users(6, n_users=1) == [4]
+
+def test_recommender_rebuild_shard():
+    mock_db = MockShardedDB()
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=1)
+    seonam_shard = recommender.shards["서남권"]
+
+    mock_db.users.append(
+        MockUser(6, prefer_places=[MockEnum("카페")], purposes=[MockEnum("휴식")], locations=[MockEnum("강북권")])
+    )
+    recommender.rebuild_shard("강북권")
+
+    assert recommender.shards["강북권"]["user_id_list"].tolist() == [1, 2, 6]
+    assert recommender.shards["서남권"] is seonam_shard
+    assert 6 in recommender.get_similar_users(1)
+
+def test_recommender_rebuild_shard_moved_user():
+    mock_db = MockShardedDB()
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=1)
+
+    # 사용자 1이 강북권에서 서남권으로 이동. 강북권 샤드는 재생성하지 않아 1을 그대로 포함한다.
+    mock_db.users[0].locations = [MockEnum("서남권")]
+    recommender.rebuild_shard("서남권")
+
+    gangbuk_shard = recommender.shards["강북권"]
+    assert not gangbuk_shard["active"][gangbuk_shard["user_idx_map"][1]]
+    assert recommender.shards["서남권"]["user_id_list"].tolist() == [1, 3, 4]
+    assert recommender.user_regions[1] == "서남권"
+
+    similar = recommender.get_similar_users(5, n_users=10)
+    assert len(similar) == len(set(similar))
+    assert sorted(similar) == [1, 2, 3, 4]
+
+    # 강북권 샤드에 남은 사용자 2는 이동한 사용자 1을 이웃으로 보지 않고 전체 샤드로 검색
+    reference = RecommenderFast(mock_db)
+    assert recommender.get_similar_users(2, n_users=1) == reference.get_similar_users(2, n_users=1)
+    assert recommender.get_similar_users(1) == [3, 4]
+
+def test_recommender_rebuild_shard_user_leaves_region():
+    mock_db = MockShardedDB()
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=1)
+
+    # 사용자 1이 지역을 모두 지움. 강북권만 재생성해도 다시 로드되어 지역 없는 샤드로 옮겨진다.
+    mock_db.users[0].locations = []
+    recommender.rebuild_shard("강북권")
+
+    assert recommender.user_regions[1] is None
+    assert recommender.shards["강북권"]["user_id_list"].tolist() == [2]
+    assert 1 in recommender.shards[None]["user_id_list"].tolist()
+
+    reference = RecommenderFast(mock_db)
+    assert recommender.get_similar_users(5, n_users=3) == reference.get_similar_users(5, n_users=3)
+    assert recommender.get_similar_users(1, n_users=3) == reference.get_similar_users(1, n_users=3)
+
+def test_recommender_rebuild_shard_user_moves_to_other_shard():
+    mock_db = MockShardedDB()
+    recommender = RecommenderFast(mock_db, sharded=True, max_workers=1)
+
+    # 사용자 1이 서남권으로 이동한 뒤 이전 지역(강북권)만 재생성
+    mock_db.users[0].locations = [MockEnum("서남권")]
+    recommender.rebuild_shard("강북권")
+
+    assert recommender.user_regions[1] == "서남권"
+    assert recommender.shards["강북권"]["user_id_list"].tolist() == [2]
+    assert recommender.shards["서남권"]["user_id_list"].tolist() == [1, 3, 4]
+    assert recommender.get_similar_users(3) == [1, 4]
+
+    similar = recommender.get_similar_users(5, n_users=10)
+    assert sorted(similar) == [1, 2, 3, 4]
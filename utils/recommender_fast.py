@@ -1,24 +1,74 @@
 # utils/recommender_fast.py
 import numpy as np
 from collections import Counter, defaultdict
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
 from sklearn.metrics.pairwise import cosine_similarity
 import time
 
 from sqlalchemy.orm import Session
-from models.db_models import UserDB, PlaceDB, LikeDB
+from models.db_models import UserDB, PlaceDB, LikeDB, UserLocationDB
 from models.models import PlaceRecommendation
 from models.enums import PlaceEnum
 
+
+def _build_shard(profiles: Dict[int, Counter], positions: List[int], with_similarity: bool = True) -> dict:
+    """
+    한 샤드(지역)의 피처 매트릭스와 유사도 행렬을 생성.
+    프로세스 풀에서 실행되므로 모듈 최상위 함수로 둔다.
+    지역이 없는 샤드는 전체 샤드 검색에만 쓰이므로 with_similarity=False 로 유사도 행렬을 생략한다.
+    positions 는 전체 사용자 목록에서의 순서로, 전체 샤드 검색 결과를 비샤드 모드와 같은 순서로 정렬하는 데 쓴다.
+    """
+    all_features = set()
+    for profile in profiles.values():
+        all_features.update(profile.keys())
+    feature_columns = {f: i for i, f in enumerate(sorted(all_features))}
+
+    user_id_list = list(profiles.keys())
+    feature_matrix = np.zeros((len(user_id_list), len(feature_columns)))
+    for row, user_id in enumerate(user_id_list):
+        for feature, count in profiles[user_id].items():
+            feature_matrix[row, feature_columns[feature]] = count
+
+    similarity_matrix = None
+    if with_similarity:
+        if feature_matrix.size == 0:
+            similarity_matrix = np.zeros((len(user_id_list), len(user_id_list)))
+        else:
+            similarity_matrix = cosine_similarity(feature_matrix)
+
+    return {
+        "feature_columns": feature_columns,
+        "user_id_list": np.array(user_id_list),
+        "user_idx_map": {uid: idx for idx, uid in enumerate(user_id_list)},
+        "positions": np.array(positions),
+        # 재생성 이후 다른 지역으로 이동한 사용자의 행은 False 로 바뀐다
+        "active": np.ones(len(user_id_list), dtype=bool),
+        "feature_matrix": feature_matrix,
+        "row_norms": np.linalg.norm(feature_matrix, axis=1),
+        "similarity_matrix": similarity_matrix,
+    }
+
 class RecommenderFast:
     """
     빠른 사용자 기반 협업 필터링 추천 시스템.
     사용자의 명시적 선호도와 좋아요 장소의 특징을 모두 반영.
+
+    sharded=True 이면 사용자를 대표 지역별 샤드로 나누고,
+    샤드마다 피처 매트릭스와 유사도 행렬을 프로세스 병렬로 생성한다.
+    대표 지역은 사용자 선호 지역 중 값이 가장 작은 것(min)으로, DB 조회 순서와 무관하게 정해진다.
+    지역이 없거나 샤드에 다른 사용자가 없는 경우, 유사 사용자 검색 시 전체 샤드를 조회한다.
+    한 지역만 갱신할 때는 rebuild_shard 를 사용하며, 반영되지 않는 경우는 해당 docstring 참고.
     """
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, sharded: bool = False, max_workers: Optional[int] = None):
         self.db = db
+        self.sharded = sharded
+        self.max_workers = max_workers
         self.user_profiles = {}
         self.user_likes = defaultdict(set)
+        self.user_regions = {}
+        self.user_positions = {}
+        self.shards = {}
         self.similarity_matrix = None
         self.feature_columns = {}
         self.user_id_list = []
@@ -28,22 +78,27 @@ class RecommenderFast:
         print("RecommenderFast 초기화 시작...")
         start_time = time.time()
         self._load_data()
-        self._create_feature_matrix()
-        self._calculate_similarity()
+        if self.sharded:
+            self._build_shards()
+        else:
+            self._create_feature_matrix()
+            self._calculate_similarity()
         print(f"RecommenderFast 초기화 완료. 소요 시간: {time.time() - start_time:.2f}초")
 
-    def _load_data(self):
-        print("데이터 로드 중...")
-        start_time = time.time()
+    @staticmethod
+    def _primary_region(user):
+        return min(l.value for l in user.locations) if user.locations else None
 
-        users = self.db.query(UserDB).all()
-        places = {p.place_id: p for p in self.db.query(PlaceDB).all()}
-        likes = self.db.query(LikeDB).all()
+    @staticmethod
+    def _build_profiles(users, places, likes):
+        user_likes = defaultdict(set)
+        user_profiles = {}
+        user_regions = {}
 
         # 사용자 좋아요 맵 생성
         for like in likes:
             if isinstance(like.place_id, int):
-                self.user_likes[like.user_id].add(like.place_id)
+                user_likes[like.user_id].add(like.place_id)
             else:
                 print(f"[WARN] 잘못된 place_id: {like.place_id} (type={type(like.place_id)})")
 
@@ -57,12 +112,26 @@ class RecommenderFast:
             profile_features.update([l.value for l in user.locations])
 
             # 좋아요한 장소 특징 반영
-            for place_id in self.user_likes[user.user_id]:
+            for place_id in user_likes[user.user_id]:
                 place = places.get(place_id)
                 if place:
                     profile_features.update([p.value for p in place.purposes])
                     profile_features.update([m.value for m in place.moods])
-            self.user_profiles[user.user_id] = profile_features
+            user_profiles[user.user_id] = profile_features
+            user_regions[user.user_id] = RecommenderFast._primary_region(user)
+
+        return user_profiles, user_likes, user_regions
+
+    def _load_data(self):
+        print("데이터 로드 중...")
+        start_time = time.time()
+
+        users = self.db.query(UserDB).all()
+        places = {p.place_id: p for p in self.db.query(PlaceDB).all()}
+        likes = self.db.query(LikeDB).all()
+
+        self.user_profiles, self.user_likes, self.user_regions = self._build_profiles(users, places, likes)
+        self.user_positions = {uid: i for i, uid in enumerate(self.user_profiles)}
 
         print(f"데이터 로드 완료. Users: {len(users)}, Places: {len(places)}, Likes: {len(likes)}")
         print(f"데이터 로드 소요 시간: {time.time() - start_time:.2f}초")
@@ -98,7 +167,173 @@ class RecommenderFast:
         self.user_idx_map = {uid: idx for idx, uid in enumerate(self.user_id_list)}
         print("유사도 행렬 계산 완료.")
 
+    def _build_shards(self):
+        print("지역별 샤드 생성 중...")
+        start_time = time.time()
+        shard_profiles = defaultdict(dict)
+        for uid, profile in self.user_profiles.items():
+            shard_profiles[self.user_regions[uid]][uid] = profile
+        regions = sorted(shard_profiles.keys(), key=lambda r: (r is None, r or ""))
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(
+                _build_shard,
+                [shard_profiles[r] for r in regions],
+                [[self.user_positions[uid] for uid in shard_profiles[r]] for r in regions],
+                [r is not None for r in regions],
+            )
+            self.shards = dict(zip(regions, results))
+        sizes = {r: len(s["user_id_list"]) for r, s in self.shards.items()}
+        print(f"지역별 샤드 생성 완료. 샤드 크기: {sizes}, 소요 시간: {time.time() - start_time:.2f}초")
+
+    def rebuild_shard(self, region: Optional[str]):
+        """
+        지정한 지역의 사용자와 좋아요만 다시 로드해 해당 샤드를 재생성.
+        현재 이 지역 선호 사용자와 함께, 기존 샤드 멤버 중 지역을 옮기거나 지웠던 사용자도 다시 로드한다.
+        대표 지역이 바뀐 사용자는 이전 샤드에서 비활성화하고, 옮겨 간 샤드는 메모리의 프로필로 다시 만든다.
+        새 상태는 모두 만든 뒤 한 번에 교체한다.
+
+        지역이 없는 샤드(None)는 단독으로 재생성할 수 없다. 지역 없이 새로 가입한 사용자나
+        다른 지역 샤드에만 속한 사용자의 변경 사항은 해당 지역을 재생성하거나 전체를 다시 초기화해야 반영된다.
+        """
+        if not self.sharded:
+            raise ValueError("rebuild_shard는 sharded 모드에서만 사용할 수 있습니다.")
+        if region is None:
+            raise ValueError("지역이 없는 샤드는 단독으로 재생성할 수 없습니다.")
+        print(f"샤드 재생성 중: region={region}")
+        start_time = time.time()
+
+        users = {
+            u.user_id: u
+            for u in self.db.query(UserDB).join(UserLocationDB).filter(UserLocationDB.value == region).all()
+        }
+        old_shard = self.shards.get(region)
+        stale_ids = [uid for uid in old_shard["user_id_list"].tolist() if uid not in users] if old_shard else []
+        if stale_ids:
+            for u in self.db.query(UserDB).filter(UserDB.user_id.in_(stale_ids)).all():
+                users[u.user_id] = u
+        users = list(users.values())
+        user_ids = [u.user_id for u in users]
+        likes = self.db.query(LikeDB).filter(LikeDB.user_id.in_(user_ids)).all() if user_ids else []
+        place_ids = list({like.place_id for like in likes})
+        places = {
+            p.place_id: p
+            for p in (self.db.query(PlaceDB).filter(PlaceDB.place_id.in_(place_ids)).all() if place_ids else [])
+        }
+        loaded_profiles, loaded_likes, loaded_regions = self._build_profiles(users, places, likes)
+
+        user_profiles = {**self.user_profiles, **loaded_profiles}
+        user_likes = defaultdict(set, self.user_likes)
+        for uid in user_ids:
+            user_likes[uid] = loaded_likes[uid]
+        user_regions = {**self.user_regions, **loaded_regions}
+        user_positions = dict(self.user_positions)
+        for uid in user_ids:
+            user_positions.setdefault(uid, len(user_positions))
+
+        # 대표 지역이 바뀌었거나 새로 추가된 사용자
+        moved = [
+            uid for uid, new_region in loaded_regions.items()
+            if uid not in self.user_regions or self.user_regions[uid] != new_region
+        ]
+        target_regions = {region} | {loaded_regions[uid] for uid in moved}
+
+        shards = dict(self.shards)
+        stale_rows = defaultdict(list)
+        for uid in moved:
+            old_region = self.user_regions.get(uid)
+            shard = shards.get(old_region)
+            if uid in self.user_regions and shard is not None and old_region not in target_regions:
+                stale_rows[old_region].append(shard["user_idx_map"][uid])
+        for old_region, rows in stale_rows.items():
+            active = shards[old_region]["active"].copy()
+            active[rows] = False
+            shards[old_region] = {**shards[old_region], "active": active}
+
+        for r in target_regions:
+            if r == region:
+                members = [uid for uid in user_ids if loaded_regions[uid] == region]
+            else:
+                shard = shards.get(r)
+                members = [
+                    uid for uid, active in zip(shard["user_id_list"].tolist(), shard["active"])
+                    if active and user_regions[uid] == r
+                ] if shard is not None else []
+                members += [uid for uid in moved if loaded_regions[uid] == r]
+            members.sort(key=user_positions.get)
+            if members:
+                shards[r] = _build_shard(
+                    {uid: user_profiles[uid] for uid in members},
+                    [user_positions[uid] for uid in members],
+                    r is not None,
+                )
+            else:
+                shards.pop(r, None)
+
+        self.user_profiles = user_profiles
+        self.user_likes = user_likes
+        self.user_regions = user_regions
+        self.user_positions = user_positions
+        self.shards = shards
+        sizes = {r: len(shards[r]["user_id_list"]) for r in target_regions if r in shards}
+        print(f"샤드 재생성 완료: region={region}, 재생성 샤드 크기: {sizes}, 소요 시간: {time.time() - start_time:.2f}초")
+
+    def _get_similar_users_in_shard(self, shard: dict, target_user_id: int, n_users: int) -> List[int]:
+        idx = shard["user_idx_map"][target_user_id]
+        sim_scores = shard["similarity_matrix"][idx]
+        is_candidate = shard["active"].copy()
+        is_candidate[idx] = False
+        sorted_indices = np.argsort(sim_scores * is_candidate)[::-1]
+        ranked = sorted_indices[is_candidate[sorted_indices]]
+        return list(shard["user_id_list"][ranked[:n_users]])
+
+    def _get_similar_users_across_shards(self, target_user_id: int, n_users: int) -> List[int]:
+        profile = self.user_profiles[target_user_id]
+        # 샤드마다 피처 공간이 다르므로 분모에는 전체 프로필의 norm을 사용해 점수를 비교 가능하게 한다
+        target_norm = np.linalg.norm(list(profile.values()))
+        scores, user_ids, positions, candidates = [], [], [], []
+        for shard in self.shards.values():
+            vec = np.zeros(len(shard["feature_columns"]))
+            for feature, count in profile.items():
+                idx = shard["feature_columns"].get(feature)
+                if idx is not None:
+                    vec[idx] = count
+            dots = shard["feature_matrix"] @ vec
+            denom = target_norm * shard["row_norms"]
+            scores.append(np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0))
+            is_candidate = shard["active"].copy()
+            idx = shard["user_idx_map"].get(target_user_id)
+            if idx is not None:
+                is_candidate[idx] = False
+            candidates.append(is_candidate)
+            user_ids.append(shard["user_id_list"])
+            positions.append(shard["positions"])
+        if not scores:
+            return []
+
+        # 비샤드 모드와 같은 사용자 순서로 맞춘 뒤 같은 방식으로 정렬
+        order = np.argsort(np.concatenate(positions), kind="stable")
+        scores = np.concatenate(scores)[order]
+        user_ids = np.concatenate(user_ids)[order]
+        is_candidate = np.concatenate(candidates)[order]
+        sorted_indices = np.argsort(scores * is_candidate)[::-1]
+        ranked = sorted_indices[is_candidate[sorted_indices]]
+        return list(user_ids[ranked[:n_users]])
+
+    def _get_similar_users_sharded(self, target_user_id: int, n_users: int) -> List[int]:
+        if target_user_id not in self.user_profiles:
+            return []
+        region = self.user_regions.get(target_user_id)
+        shard = self.shards.get(region)
+        if region is not None and shard is not None and target_user_id in shard["user_idx_map"]:
+            similar = self._get_similar_users_in_shard(shard, target_user_id, n_users)
+            if similar:
+                return similar
+        # 지역이 없거나 샤드에 다른 사용자가 없으면 전체 샤드에서 검색
+        return self._get_similar_users_across_shards(target_user_id, n_users)
+
     def get_similar_users(self, target_user_id: int, n_users: int = 5) -> List[int]:
+        if self.sharded:
+            return self._get_similar_users_sharded(target_user_id, n_users)
         if target_user_id not in self.user_idx_map:
             return []
         idx = self.user_idx_map[target_user_id]